@@ -26,6 +26,10 @@ VENV_ACTIVATE = PROJECT_ROOT / ".venv" / "bin" / "activate"
 # --- Environment passthrough (keeps keys out of logs) --------------------------
 ENV = {
     "NEWS_API_KEY": os.environ.get("NEWS_API_KEY", ""),
+    # Tells the jobs where the repo lives (skips filesystem probing)
+    "MARKETSENSE_ROOT": str(PROJECT_ROOT),
+    # Optional: lets the jobs invalidate the API's response cache after ingest
+    "REDIS_URL": os.environ.get("REDIS_URL", ""),
     # Add other env you want to pass through here
 }
 
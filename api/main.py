@@ -1,17 +1,33 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from time import monotonic
+from typing import Annotated, List, Optional
+import base64
+import hashlib
+import json
+import logging
 import os
 import sqlite3
+import threading
 
-from fastapi import FastAPI, HTTPException, Query
+import orjson
+import redis
+from fastapi import FastAPI, HTTPException, Path as PathParam, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field
 
 # --- Config ---
 DB_PATH = Path(os.getenv("DB_PATH", "data/marketsense.db")).resolve()
+# Optional response cache; the DB only changes once a day (Airflow ingest)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "120"))
+# Ticker set changes at most daily; keep it in memory between reloads
+TICKER_REFRESH_SECONDS = int(os.getenv("TICKER_REFRESH_SECONDS", "21600"))  # 6h
+TICKER_MISS_RELOAD_SECONDS = 60  # unknown ticker -> reload at most this often
+
+log = logging.getLogger(__name__)
 
 app = FastAPI(title="MarketSense API", version="0.5.0", docs_url="/docs")
 
@@ -21,31 +37,203 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["GET"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # --- Models ---
+# Tickers are checked and uppercased once, at the request boundary
+# (e.g. AAPL, BRK-B, 7203.T, ^GSPC, EURUSD=X)
+_TICKER_PATTERN = r"^[\^A-Za-z0-9][A-Za-z0-9.=\-]{0,11}$"
+Ticker = Annotated[str, PathParam(pattern=_TICKER_PATTERN), AfterValidator(str.upper)]
+TickerQuery = Annotated[str, Query(pattern=_TICKER_PATTERN), AfterValidator(str.upper)]
+
 class StockClose(BaseModel):
     date: str = Field(..., description="ISO date (YYYY-MM-DD)")
     close: float
 
 class NewsItem(BaseModel):
+    id: int
     published_at: str = Field(..., description="ISO datetime")
-    source: str
+    source: Optional[str] = None
     headline: str
     url: str
 
+# --- SQL ---
+# Fixed strings so sqlite3's per-connection statement cache reuses the
+# prepared statement instead of re-parsing on every request.
+_SQL_TICKERS = "SELECT DISTINCT ticker FROM stocks;"
+
+_SQL_STOCKS_BY_DAYS = """
+SELECT date, close
+FROM stocks
+WHERE ticker = ?
+  AND date >= ?
+ORDER BY date ASC
+"""
+
+_SQL_STOCKS_LAST_N = """
+SELECT date, close
+FROM stocks
+WHERE ticker = ?
+ORDER BY date DESC
+LIMIT ?
+"""
+
+# News pages are ordered by (published_at, id) so a cursor can resume right
+# after the last row seen (keyset) instead of skipping rows with OFFSET.
+_SQL_NEWS_BY_DAYS = """
+SELECT id, published_at, source, headline, url
+FROM news
+WHERE published_at >= ?
+ORDER BY published_at DESC, id DESC
+LIMIT ? OFFSET ?
+"""
+
+_SQL_NEWS_BY_DAYS_AFTER = """
+SELECT id, published_at, source, headline, url
+FROM news
+WHERE published_at >= ?
+  AND (published_at, id) < (?, ?)
+ORDER BY published_at DESC, id DESC
+LIMIT ?
+"""
+
+# Keyword filter goes through the news_fts full-text index (002_indexes.sql)
+_SQL_NEWS_BY_DAYS_Q = """
+SELECT n.id, n.published_at, n.source, n.headline, n.url
+FROM news_fts f
+JOIN news n ON n.id = f.rowid
+WHERE news_fts MATCH ?
+  AND n.published_at >= ?
+ORDER BY n.published_at DESC, n.id DESC
+LIMIT ? OFFSET ?
+"""
+
+_SQL_NEWS_BY_DAYS_Q_AFTER = """
+SELECT n.id, n.published_at, n.source, n.headline, n.url
+FROM news_fts f
+JOIN news n ON n.id = f.rowid
+WHERE news_fts MATCH ?
+  AND n.published_at >= ?
+  AND (n.published_at, n.id) < (?, ?)
+ORDER BY n.published_at DESC, n.id DESC
+LIMIT ?
+"""
+
+_SQL_NEWS_LAST_N = """
+SELECT id, published_at, source, headline, url
+FROM news
+ORDER BY published_at DESC, id DESC
+LIMIT ? OFFSET ?
+"""
+
+_SQL_NEWS_LAST_N_AFTER = """
+SELECT id, published_at, source, headline, url
+FROM news
+WHERE (published_at, id) < (?, ?)
+ORDER BY published_at DESC, id DESC
+LIMIT ?
+"""
+
 # --- DB helpers ---
+# Read-heavy workload: one long-lived connection per worker thread instead of
+# an open/close per request, so the page cache stays warm between requests.
+# The API never writes, so connections are opened read-only (mode=ro); the
+# journal mode (WAL) is owned by db_setup and the ingest jobs.
+_DB_URI = f"{DB_PATH.as_uri()}?mode=ro"
+_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA mmap_size=268435456;",  # 256 MiB
+    "PRAGMA cache_size=-65536;",    # 64 MiB
+)
+_local = threading.local()
+
 def get_conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
     if not DB_PATH.exists():
         raise HTTPException(status_code=500, detail=f"DB not found at {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = sqlite3.connect(
+        _DB_URI,
+        uri=True,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=256,
+    )
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    # plain tuples (row_factory=None): the handlers only index by position
+    _local.conn = conn
     return conn
 
-def ticker_exists(conn: sqlite3.Connection, ticker: str) -> bool:
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM stocks WHERE ticker = ? LIMIT 1;", (ticker.upper(),))
-    return cur.fetchone() is not None
+# --- Cache helpers (cache-aside; no-ops when REDIS_URL is unset) ---
+_cache = redis.Redis.from_url(REDIS_URL, socket_timeout=0.25) if REDIS_URL else None
+
+def cache_get(key: str) -> Optional[list]:
+    if _cache is None:
+        return None
+    try:
+        val = _cache.get(key)
+    except redis.RedisError as e:
+        log.warning("cache get failed for %s: %s", key, e)
+        return None
+    return orjson.loads(val) if val is not None else None
+
+def cache_set(key: str, payload: list) -> None:
+    if _cache is None:
+        return
+    try:
+        _cache.set(key, orjson.dumps(payload), ex=CACHE_TTL_SECONDS)
+    except redis.RedisError as e:
+        log.warning("cache set failed for %s: %s", key, e)
+
+def fts_query(q: str) -> str:
+    # every word must appear as a word prefix; quoting keeps FTS5 operators
+    # and punctuation in user input from being parsed as query syntax
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in q.split())
+
+def encode_cursor(published_at: str, news_id: int) -> str:
+    raw = json.dumps([published_at, news_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        published_at, news_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not isinstance(published_at, str) or not isinstance(news_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return published_at, news_id
+
+def _next_cursor_headers(payload: list, limit: int) -> dict:
+    # a full page means there may be more; hand back where to resume
+    if len(payload) == limit:
+        last = payload[-1]
+        return {"X-Next-Cursor": encode_cursor(last["published_at"], last["id"])}
+    return {}
+
+def json_response(payload: list, headers: Optional[dict] = None) -> Response:
+    # orjson straight to bytes; skips per-row pydantic validation + re-encoding
+    return Response(orjson.dumps(payload), media_type="application/json", headers=headers)
+
+# (tickers, monotonic load time); swapped as a whole so readers never lock
+_ticker_cache: tuple = (frozenset(), float("-inf"))
+
+def _load_tickers() -> frozenset:
+    global _ticker_cache
+    tickers = frozenset(r[0] for r in get_conn().execute(_SQL_TICKERS))
+    _ticker_cache = (tickers, monotonic())
+    return tickers
+
+def ticker_exists(ticker: str) -> bool:
+    tickers, loaded_at = _ticker_cache
+    age = monotonic() - loaded_at
+    # periodic refresh, plus a rate-limited reload on a miss so tickers added
+    # by the ingest DAG show up without waiting for the next refresh
+    if age > TICKER_REFRESH_SECONDS or (ticker not in tickers and age > TICKER_MISS_RELOAD_SECONDS):
+        tickers = _load_tickers()
+    return ticker in tickers
 
 # --- Health ---
 @app.get("/health")
@@ -57,146 +245,167 @@ def health() -> dict:
 # =======================
 @app.get(
     "/stocks/{ticker}",
-    response_model=List[StockClose],
+    response_class=Response,
+    responses={200: {"model": List[StockClose]}},
     summary="Get last N calendar days of closing prices for a ticker",
 )
 def stocks_by_days(
-    ticker: str,
+    ticker: Ticker,
     days: int = Query(7, ge=1, le=365, description="Calendar days to look back"),
 ):
+    key = f"ms:v1:stocks:{ticker}:days:{days}"
+    payload = cache_get(key)
+    if payload is not None:
+        return json_response(payload)
+    if not ticker_exists(ticker):
+        raise HTTPException(status_code=400, detail=f"Unknown ticker: {ticker}")
     today_utc = datetime.now(timezone.utc).date()
     cutoff = (today_utc - timedelta(days=days)).isoformat()
-    with get_conn() as conn:
-        if not ticker_exists(conn, ticker):
-            raise HTTPException(status_code=400, detail=f"Unknown ticker: {ticker.upper()}")
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT date, close
-            FROM stocks
-            WHERE ticker = ?
-              AND date >= ?
-            ORDER BY date ASC
-            """,
-            (ticker.upper(), cutoff),
-        )
-        rows = cur.fetchall()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(_SQL_STOCKS_BY_DAYS, (ticker, cutoff))
+    rows = cur.fetchall()
     if not rows:
-        raise HTTPException(status_code=404, detail=f"No data for {ticker.upper()} in the last {days} day(s).")
-    return [StockClose(date=str(r["date"])[:10], close=float(r["close"])) for r in rows]
+        raise HTTPException(status_code=404, detail=f"No data for {ticker} in the last {days} day(s).")
+    payload = [{"date": r[0][:10], "close": r[1]} for r in rows]
+    cache_set(key, payload)
+    return json_response(payload)
 
 @app.get(
     "/stocks/{ticker}/last-n",
-    response_model=List[StockClose],
+    response_class=Response,
+    responses={200: {"model": List[StockClose]}},
     summary="Get last N trading rows for a ticker",
 )
 def stocks_last_n(
-    ticker: str,
+    ticker: Ticker,
     n: int = Query(7, ge=1, le=252, description="Number of trading rows to return"),
 ):
-    with get_conn() as conn:
-        if not ticker_exists(conn, ticker):
-            raise HTTPException(status_code=400, detail=f"Unknown ticker: {ticker.upper()}")
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT date, close
-            FROM stocks
-            WHERE ticker = ?
-            ORDER BY date DESC
-            LIMIT ?
-            """,
-            (ticker.upper(), n),
-        )
-        rows = cur.fetchall()
+    key = f"ms:v1:stocks:{ticker}:last:{n}"
+    payload = cache_get(key)
+    if payload is not None:
+        return json_response(payload)
+    if not ticker_exists(ticker):
+        raise HTTPException(status_code=400, detail=f"Unknown ticker: {ticker}")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(_SQL_STOCKS_LAST_N, (ticker, n))
+    rows = cur.fetchall()
     if not rows:
-        raise HTTPException(status_code=404, detail=f"No data for {ticker.upper()}.")
+        raise HTTPException(status_code=404, detail=f"No data for {ticker}.")
     # oldest → newest
-    return [StockClose(date=str(r["date"])[:10], close=float(r["close"])) for r in reversed(rows)]
+    payload = [{"date": r[0][:10], "close": r[1]} for r in reversed(rows)]
+    cache_set(key, payload)
+    return json_response(payload)
 
 # =======================
 # News (2 endpoints)
 # =======================
 @app.get(
     "/news",
-    response_model=List[NewsItem],
+    response_class=Response,
+    responses={200: {"model": List[NewsItem]}},
     summary="Get recent news (calendar-day window with optional keyword)",
 )
 def news_by_days(
     days: int = Query(7, ge=1, le=60, description="Calendar days to look back"),
-    q: Optional[str] = Query(None, description="Keyword (headline/source LIKE)"),
+    q: Optional[str] = Query(None, description="Keyword(s) matched as word prefixes in headline/source"),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Ignored when cursor is given"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
 ):
+    q_hash = hashlib.sha1(q.encode()).hexdigest() if q else ""
+    key = f"ms:v1:news:days:{days}:q:{q_hash}:l:{limit}:o:{offset}:c:{cursor or ''}"
+    payload = cache_get(key)
+    if payload is not None:
+        return json_response(payload, _next_cursor_headers(payload, limit))
+
     # midnight UTC cutoff so an index on published_at can be used
     today_utc = datetime.now(timezone.utc).date()
-    cutoff_ts = f"{(today_utc - timedelta(days=days)).isoformat()}T00:00:00"
+    cutoff_ts = datetime.combine(today_utc - timedelta(days=days), time()).isoformat(timespec="seconds")
 
-    sql = [
-        "SELECT published_at, source, headline, url",
-        "FROM news",
-        "WHERE published_at >= ?",
-    ]
-    params: List[object] = [cutoff_ts]
-
-    if q:
-        sql.append("AND (headline LIKE ? OR source LIKE ?)")
-        like = f"%{q}%"
-        params.extend([like, like])
+    after = decode_cursor(cursor) if cursor else None
+    match = fts_query(q) if q else ""
+    if match:
+        if after:
+            sql = _SQL_NEWS_BY_DAYS_Q_AFTER
+            params: tuple = (match, cutoff_ts, *after, limit)
+        else:
+            sql = _SQL_NEWS_BY_DAYS_Q
+            params = (match, cutoff_ts, limit, offset)
+    elif after:
+        sql = _SQL_NEWS_BY_DAYS_AFTER
+        params = (cutoff_ts, *after, limit)
+    else:
+        sql = _SQL_NEWS_BY_DAYS
+        params = (cutoff_ts, limit, offset)
 
-    sql.append("ORDER BY published_at DESC")
-    sql.append("LIMIT ? OFFSET ?")
-    params.extend([limit, offset])
-
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("\n".join(sql), params)
-        rows = cur.fetchall()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
 
     if not rows:
         raise HTTPException(status_code=404, detail="No news found for the given filters.")
-    return [NewsItem(published_at=str(r["published_at"]), source=str(r["source"]), headline=str(r["headline"]), url=str(r["url"])) for r in rows]
+    payload = [
+        {"id": r[0], "published_at": r[1], "source": r[2], "headline": r[3], "url": r[4]}
+        for r in rows
+    ]
+    cache_set(key, payload)
+    return json_response(payload, _next_cursor_headers(payload, limit))
 
 @app.get(
     "/news/last-n",
-    response_model=List[NewsItem],
+    response_class=Response,
+    responses={200: {"model": List[NewsItem]}},
     summary="Get latest N news rows (no date filter)",
 )
 def news_last_n(
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Ignored when cursor is given"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
 ):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT published_at, source, headline, url
-            FROM news
-            ORDER BY published_at DESC
-            LIMIT ? OFFSET ?
-            """,
-            (limit, offset),
-        )
-        rows = cur.fetchall()
+    key = f"ms:v1:news:last:l:{limit}:o:{offset}:c:{cursor or ''}"
+    payload = cache_get(key)
+    if payload is not None:
+        return json_response(payload, _next_cursor_headers(payload, limit))
+    conn = get_conn()
+    cur = conn.cursor()
+    if cursor:
+        cur.execute(_SQL_NEWS_LAST_N_AFTER, (*decode_cursor(cursor), limit))
+    else:
+        cur.execute(_SQL_NEWS_LAST_N, (limit, offset))
+    rows = cur.fetchall()
     if not rows:
         raise HTTPException(status_code=404, detail="No news available.")
-    return [NewsItem(published_at=str(r["published_at"]), source=str(r["source"]), headline=str(r["headline"]), url=str(r["url"])) for r in rows]
+    payload = [
+        {"id": r[0], "published_at": r[1], "source": r[2], "headline": r[3], "url": r[4]}
+        for r in rows
+    ]
+    cache_set(key, payload)
+    return json_response(payload, _next_cursor_headers(payload, limit))
 
 # -----------------------
 # Back-compat routes (hidden from docs)
 # -----------------------
 @app.get("/get-stock", include_in_schema=False)
-def _compat_get_stock(ticker: str, days: int = 7):
+def _compat_get_stock(ticker: TickerQuery, days: int = 7):
     return stocks_by_days(ticker=ticker, days=days)
 
 @app.get("/get-stock/last-n", include_in_schema=False)
-def _compat_get_stock_last_n(ticker: str, n: int = 7):
+def _compat_get_stock_last_n(ticker: TickerQuery, n: int = 7):
     return stocks_last_n(ticker=ticker, n=n)
 
 @app.get("/get-news", include_in_schema=False)
-def _compat_get_news(days: int = 7, q: Optional[str] = None, limit: int = 20, offset: int = 0):
-    return news_by_days(days=days, q=q, limit=limit, offset=offset)
+def _compat_get_news(
+    days: int = 7,
+    q: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+):
+    return news_by_days(days=days, q=q, limit=limit, offset=offset, cursor=cursor)
 
 @app.get("/news/latest", include_in_schema=False)
-def _compat_news_latest(limit: int = 20, offset: int = 0):
-    return news_last_n(limit=limit, offset=offset)
+def _compat_news_latest(limit: int = 20, offset: int = 0, cursor: Optional[str] = None):
+    return news_last_n(limit=limit, offset=offset, cursor=cursor)
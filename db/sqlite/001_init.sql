@@ -12,10 +12,6 @@ CREATE TABLE IF NOT EXISTS stocks (
   CHECK (close >= 0)
 );
 
--- Fast “most recent” lookups
-CREATE INDEX IF NOT EXISTS idx_stocks_ticker_date_desc
-  ON stocks(ticker, date DESC);
-
 -- Minimal news table
 CREATE TABLE IF NOT EXISTS news (
   id           INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,6 +20,3 @@ CREATE TABLE IF NOT EXISTS news (
   source       TEXT,
   url          TEXT UNIQUE
 );
-
-CREATE INDEX IF NOT EXISTS idx_news_published_at
-  ON news(published_at DESC);
@@ -0,0 +1,45 @@
+-- Read-path indexes for the API (safe to re-run on an existing DB).
+
+-- Stocks: covering index so close lookups by ticker/date never touch the table
+CREATE INDEX IF NOT EXISTS idx_stocks_ticker_date_close
+  ON stocks(ticker, date DESC, close);
+
+-- Superseded by the covering index above (the PK already enforces uniqueness)
+DROP INDEX IF EXISTS idx_stocks_ticker_date_desc;
+
+-- News: covering index for the newest-first listings (no rowid lookups).
+-- Column order matches ORDER BY published_at DESC, id DESC exactly, so the
+-- plan is a plain index walk with no TEMP B-TREE for the id tie-breaker.
+CREATE INDEX IF NOT EXISTS idx_news_pub_id_covering
+  ON news(published_at DESC, id DESC, source, headline, url);
+
+-- Superseded by idx_news_pub_id_covering: the old 001 index is a prefix of it,
+-- and idx_news_pub_covering still needed a sort for the id tie-breaker
+DROP INDEX IF EXISTS idx_news_published_at;
+DROP INDEX IF EXISTS idx_news_pub_covering;
+
+-- News: full-text index over headline/source for the keyword filter
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+  headline, source,
+  content='news', content_rowid='id'
+);
+
+-- Keep news_fts in sync (the ingest UPSERT fires the UPDATE trigger too)
+CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN
+  INSERT INTO news_fts(rowid, headline, source) VALUES (new.id, new.headline, new.source);
+END;
+CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN
+  INSERT INTO news_fts(news_fts, rowid, headline, source) VALUES ('delete', old.id, old.headline, old.source);
+END;
+CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE ON news BEGIN
+  INSERT INTO news_fts(news_fts, rowid, headline, source) VALUES ('delete', old.id, old.headline, old.source);
+  INSERT INTO news_fts(rowid, headline, source) VALUES (new.id, new.headline, new.source);
+END;
+
+-- Index rows that existed before the triggers (cheap at this table size)
+INSERT INTO news_fts(news_fts) VALUES ('rebuild');
+
+-- Planner statistics so the covering indexes above are chosen reliably.
+-- (Partial "recent window" indexes are deliberately absent: SQLite only uses
+-- one when the query repeats its WHERE term verbatim, never for `>= ?`.)
+ANALYZE;
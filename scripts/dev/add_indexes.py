@@ -0,0 +1,39 @@
+import sqlite3, pathlib, sys, os
+
+DB = pathlib.Path(os.getenv("MARKETSENSE_DB_FILE", "data/marketsense.db"))
+
+SQL_PATH = pathlib.Path("db/sqlite/002_indexes.sql")
+
+# Hot API queries; each plan should read "USING COVERING INDEX" with no TEMP B-TREE
+PLAN_CHECKS = [
+    ("SELECT date, close FROM stocks WHERE ticker = ? AND date >= ? ORDER BY date ASC", ("AAPL", "2025-01-01")),
+    ("SELECT date, close FROM stocks WHERE ticker = ? ORDER BY date DESC LIMIT ?", ("AAPL", 7)),
+    ("SELECT id, published_at, source, headline, url FROM news WHERE published_at >= ? ORDER BY published_at DESC, id DESC LIMIT ? OFFSET ?", ("2025-01-01T00:00:00", 20, 0)),
+    ("SELECT id, published_at, source, headline, url FROM news ORDER BY published_at DESC, id DESC LIMIT ? OFFSET ?", (20, 0)),
+    ("SELECT id, published_at, source, headline, url FROM news WHERE (published_at, id) < (?, ?) ORDER BY published_at DESC, id DESC LIMIT ?", ("2025-01-01T00:00:00", 1, 20)),
+]
+
+def run():
+    if not DB.exists():
+        print(f"DB not found: {DB}")
+        sys.exit(1)
+    if not SQL_PATH.exists():
+        print(f"SQL not found: {SQL_PATH}")
+        sys.exit(1)
+
+    con = sqlite3.connect(DB)
+    try:
+        con.executescript(SQL_PATH.read_text(encoding="utf-8"))
+        con.commit()
+        print(f"✅ Indexes applied from {SQL_PATH} -> {DB}")
+
+        print("\n-- Query plans --")
+        for sql, params in PLAN_CHECKS:
+            print(f"\n{sql}")
+            for row in con.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+                print(f"  {row[-1]}")
+    finally:
+        con.close()
+
+if __name__ == "__main__":
+    run()
@@ -5,11 +5,13 @@ ROOT = pathlib.Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from src.db.queries import get_recent_closes, get_latest_news
+from src.db.queries import get_connection, get_recent_closes, get_latest_news
 
 if __name__ == "__main__":
-    print("\n=== Helper: recent closes AAPL (7) ===")
-    print(get_recent_closes("AAPL", 7))
+    # one connection for both helpers (no extra pool checkout per call)
+    with get_connection() as conn:
+        print("\n=== Helper: recent closes AAPL (7) ===")
+        print(get_recent_closes("AAPL", 7, conn=conn))
 
-    print("\n=== Helper: latest news (5) ===")
-    print(get_latest_news(5))
+        print("\n=== Helper: latest news (5) ===")
+        print(get_latest_news(5, conn=conn))
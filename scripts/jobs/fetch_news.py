@@ -2,7 +2,7 @@
 """
 Fetch recent news via NewsAPI and idempotently upsert into SQLite `news` table.
 
-Schema created if missing:
+Schema created/upgraded via the shared migrations (src/db/db_setup.py):
   news(
     id           INTEGER PRIMARY KEY AUTOINCREMENT,
     headline     TEXT NOT NULL,
@@ -15,16 +15,27 @@ Schema created if missing:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
 import logging
 import os
+import re
 import sqlite3
-import time
+import sys
 from datetime import datetime, timedelta, timezone
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import httpx
 from dotenv import load_dotenv
-from newsapi import NewsApiClient
+
+# Repo root on sys.path so the shared `src` helpers import when run as a script
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(_REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT))
+from src.cache import invalidate_cache  # noqa: E402
+from src.db.db_setup import apply_migrations  # noqa: E402
 
 # -------------------------
 # Logging
@@ -55,6 +66,12 @@ EVERYTHING_QUERIES = [
 ]
 
 PAGE_SIZE = 100
+# URLs per `IN (...)` lookup (stays under SQLite's bound-parameter limit)
+LOOKUP_CHUNK = 500
+
+NEWSAPI_BASE_URL = "https://newsapi.org/v2"
+# Sweeps are independent HTTP round trips; run a few at once
+MAX_CONCURRENCY = 6
 
 # No-op-safe UPSERT
 UPSERT_SQL = """
@@ -74,6 +91,7 @@ WHERE
 # -------------------------
 # Path / DB helpers
 # -------------------------
+@functools.lru_cache(maxsize=1)
 def _is_airflow_container() -> bool:
     # when running via our docker-compose the repo is mounted at /opt/marketsense
     try:
@@ -90,8 +108,14 @@ def resolve_db_path(cli_db: Optional[str]) -> Path:
          or MARKETSENSE_DB_FILE (file path)
          or MARKETSENSE_DB_URL (if sqlite URL, convert to file path)
       3) default 'data/marketsense.db' under repo root
+    Repo root is MARKETSENSE_ROOT when set (the DAG passes it), otherwise
+    /opt/marketsense inside our containers, otherwise the cwd.
     """
-    root = Path("/opt/marketsense") if _is_airflow_container() else Path.cwd()
+    env_root = os.getenv("MARKETSENSE_ROOT")
+    if env_root:
+        root = Path(env_root)
+    else:
+        root = Path("/opt/marketsense") if _is_airflow_container() else Path.cwd()
 
     # Read envs (prefer file paths; accept URL and convert if sqlite)
     env_db_raw = (
@@ -118,20 +142,36 @@ def resolve_db_path(cli_db: Optional[str]) -> Path:
 
 
 def ensure_schema(con: sqlite3.Connection) -> None:
-    con.executescript(
-        """
-        PRAGMA foreign_keys = ON;
-        CREATE TABLE IF NOT EXISTS news (
-          id           INTEGER PRIMARY KEY AUTOINCREMENT,
-          headline     TEXT NOT NULL,
-          published_at TEXT NOT NULL,
-          source       TEXT,
-          url          TEXT UNIQUE
-        );
-        CREATE INDEX IF NOT EXISTS idx_news_published_at
-          ON news(published_at DESC);
-        """
-    )
+    """Create/upgrade the schema via the shared migrations (no-op once current)."""
+    ran = apply_migrations(con)
+    if ran:
+        log.info("Applied %d schema migration(s)", ran)
+
+
+def iter_changed(
+    con: sqlite3.Connection,
+    rows: Iterable[Tuple[str, str, str, str]],
+) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Drop rows whose URL is already stored with the same headline, published_at
+    and source, so the UPSERT only sees new or changed articles. Works through
+    `rows` LOOKUP_CHUNK at a time (one `IN (...)` lookup each), so the stream
+    feeding executemany is never materialized.
+    """
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, LOOKUP_CHUNK))
+        if not chunk:
+            return
+        placeholders = ",".join("?" * len(chunk))
+        cur = con.execute(
+            f"SELECT url, headline, published_at, source FROM news WHERE url IN ({placeholders})",
+            [r[3] for r in chunk],
+        )
+        stored = {url: (headline, published_at, source) for url, headline, published_at, source in cur}
+        for r in chunk:
+            if stored.get(r[3]) != (r[0], r[1], r[2]):
+                yield r
 
 
 # -------------------------
@@ -147,17 +187,32 @@ def iso_no_tz(dt: datetime) -> str:
     return dt_utc.strftime("%Y-%m-%dT%H:%M:%S")
 
 
+# Already-UTC timestamps (the NewsAPI norm): 'Z', '+00:00' or no suffix,
+# optional fractional seconds. These need slicing plus a field check, not
+# timezone conversion.
+_UTC_ISO_RE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2}:\d{2})(?:\.\d+)?(?:Z|[+-]00:?00)?$"
+)
+
+
 def normalize_published_at(value: Optional[str]) -> Optional[str]:
     """
     Normalize publishedAt strings from the API into YYYY-MM-DDTHH:MM:SS (no tz).
-    Accepts '2025-08-21T12:34:56Z' or '2025-08-21T12:34:56+00:00' variants.
+    Accepts '2025-08-21T12:34:56Z' or '2025-08-21T12:34:56+00:00' variants;
+    other offsets are converted to UTC.
     """
     if not value:
         return None
+    m = _UTC_ISO_RE.match(value)
+    if m:
+        stamp = f"{m.group(1)}T{m.group(2)}"
+        try:
+            # the regex only checks shape; reject 2024-13-45T99:99:99 and the like
+            datetime.fromisoformat(stamp)
+            return stamp
+        except ValueError:
+            pass  # fall through to the lenient parse below
     try:
-        if value.endswith("Z"):
-            dt = datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-            return iso_no_tz(dt)
         try:
             dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
             return iso_no_tz(dt)
@@ -177,57 +232,72 @@ def _normalize_article(a: Dict) -> Optional[Tuple[str, str, str, str]]:
     """
     Returns tuple (headline, published_at, source, url) or None if incomplete.
     """
+    # cheapest rejects first; only parse the timestamp of otherwise-complete articles
     title = (a.get("title") or "").strip()
-    published_at = normalize_published_at(a.get("publishedAt"))
+    if not title:
+        return None
     url = (a.get("url") or "").strip()
-    if not title or not published_at or not url:
+    if not url:
         return None
-    source_name = (a.get("source") or {}).get("name") or ""
+    published_at = normalize_published_at(a.get("publishedAt"))
+    if not published_at:
+        return None
+    source = a.get("source")
+    # a handful of outlets cover most articles; share one string per name
+    source_name = sys.intern(source.get("name") or "") if source else ""
     return (title, published_at, source_name, url)
 
 
-def fetch_top_headlines(
-    client: NewsApiClient,
-    country: str,
-    category: str,
+async def _fetch_pages(
+    http: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    stop: asyncio.Event,
+    path: str,
+    params: Dict,
+    label: str,
     page_cap: int,
     verbose: bool,
 ) -> Optional[List[Dict]]:
     """
-    Pull Top Headlines for a given (country, category).
+    Page through one NewsAPI endpoint.
     Returns:
-      - list[articles] on success
+      - list[articles] on success (possibly partial if another sweep hit the rate limit)
       - [] if empty page(s) / soft errors
-      - None if rateLimited (signals caller to stop whole run)
+      - None if rateLimited (also sets `stop` so the other sweeps bail out)
     """
     all_articles: List[Dict] = []
     page = 1
-    while True:
-        try:
-            resp = client.get_top_headlines(
-                country=country, category=category, page=page, page_size=PAGE_SIZE
-            )
-        except Exception as e:
-            if verbose:
-                log.warning("top_headlines request error %s/%s page %s: %s", country, category, page, e)
-            time.sleep(1.0)
+    while not stop.is_set():
+        query = {**params, "page": page, "pageSize": PAGE_SIZE}
+        async with sem:
             try:
-                resp = client.get_top_headlines(
-                    country=country, category=category, page=page, page_size=PAGE_SIZE
-                )
-            except Exception as e2:
+                resp = await http.get(path, params=query)
+            except httpx.HTTPError as e:
                 if verbose:
-                    log.warning("top_headlines retry failed %s/%s page %s: %s", country, category, page, e2)
-                return []
+                    log.warning("%s request error page %s: %s", label, page, e)
+                await asyncio.sleep(1.0)
+                try:
+                    resp = await http.get(path, params=query)
+                except httpx.HTTPError as e2:
+                    if verbose:
+                        log.warning("%s retry failed page %s: %s", label, page, e2)
+                    return []
 
-        if resp.get("status") != "ok":
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        if resp.status_code == 429 or body.get("code") == "rateLimited":
+            if verbose:
+                log.warning("%s rate-limited page %s: %s", label, page, body)
+            stop.set()
+            return None
+        if body.get("status") != "ok":
             if verbose:
-                log.warning("top_headlines non-ok %s/%s page %s: %s", country, category, page, resp)
-            if isinstance(resp, dict) and resp.get("code") == "rateLimited":
-                return None
+                log.warning("%s non-ok page %s: %s", label, page, body)
             return []
 
-        articles = resp.get("articles") or []
+        articles = body.get("articles") or []
         if not articles:
             break
         all_articles.extend(articles)
@@ -235,12 +305,38 @@ def fetch_top_headlines(
         if len(articles) < PAGE_SIZE or page >= page_cap:
             break
         page += 1
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
     return all_articles
 
 
-def fetch_everything(
-    client: NewsApiClient,
+async def fetch_top_headlines(
+    http: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    stop: asyncio.Event,
+    country: str,
+    category: str,
+    page_cap: int,
+    verbose: bool,
+) -> Optional[List[Dict]]:
+    """
+    Pull Top Headlines for a given (country, category).
+    Returns list, [] if empty, None if rateLimited.
+    """
+    label = f"top_headlines[{country}/{category}]"
+    arts = await _fetch_pages(
+        http, sem, stop, "/top-headlines",
+        {"country": country, "category": category},
+        label, page_cap, verbose,
+    )
+    if verbose and arts is not None:
+        log.info("%s: %d", label, len(arts))
+    return arts
+
+
+async def fetch_everything(
+    http: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    stop: asyncio.Event,
     query: str,
     hours: int,
     page_cap: int,
@@ -248,52 +344,77 @@ def fetch_everything(
 ) -> Optional[List[Dict]]:
     """
     Pull Everything for a broad query within a recent lookback window.
-    Returns list, [] if empty, None if rateLimited (caller should stop whole run).
+    Returns list, [] if empty, None if rateLimited.
     """
     to_dt = datetime.now(timezone.utc)
     from_dt = to_dt - timedelta(hours=hours)
-    all_articles: List[Dict] = []
-    page = 1
-    while True:
-        params = dict(
-            q=query,
-            from_param=iso_no_tz(from_dt),
-            to=iso_no_tz(to_dt),
-            language=LANG,
-            sort_by="publishedAt",
-            page=page,
-            page_size=PAGE_SIZE,
-        )
-        try:
-            resp = client.get_everything(**params)
-        except Exception as e:
-            if verbose:
-                log.warning("everything request error [%s] page %s: %s", query, page, e)
-            time.sleep(1.0)
-            try:
-                resp = client.get_everything(**params)
-            except Exception as e2:
-                if verbose:
-                    log.warning("everything retry failed [%s] page %s: %s", query, page, e2)
-                return []
+    label = f"everything[{query}]"
+    arts = await _fetch_pages(
+        http, sem, stop, "/everything",
+        {
+            "q": query,
+            "from": iso_no_tz(from_dt),
+            "to": iso_no_tz(to_dt),
+            "language": LANG,
+            "sortBy": "publishedAt",
+        },
+        label, page_cap, verbose,
+    )
+    if verbose and arts is not None:
+        log.info("%s: %d", label, len(arts))
+    return arts
 
-        if resp.get("status") != "ok":
-            if verbose:
-                log.warning("everything non-ok [%s] page %s: %s", query, page, resp)
-            if isinstance(resp, dict) and resp.get("code") == "rateLimited":
-                return None
-            return []
 
-        articles = resp.get("articles") or []
-        if not articles:
-            break
-        all_articles.extend(articles)
-
-        if len(articles) < PAGE_SIZE or page >= page_cap:
-            break
-        page += 1
-        time.sleep(0.1)
-    return all_articles
+async def fetch_all(
+    api_key: str,
+    countries: List[str],
+    page_cap: int,
+    window_hours: int,
+    verbose: bool,
+) -> List[Optional[List[Dict]]]:
+    """
+    Run the Top Headlines breadth sweep and the Everything thematic sweep
+    concurrently (bounded by MAX_CONCURRENCY). Results keep sweep order:
+    top headlines first, then everything, so URL dedup stays deterministic.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(
+        base_url=NEWSAPI_BASE_URL,
+        headers={"X-Api-Key": api_key},  # header keeps the key out of logged URLs
+        timeout=20,
+        limits=httpx.Limits(max_connections=8),
+    ) as http:
+        top = [
+            fetch_top_headlines(http, sem, stop, country, category, page_cap, verbose)
+            for country in countries
+            for category in TOP_HEADLINES_CATEGORIES
+        ]
+        everything = [
+            fetch_everything(http, sem, stop, q, window_hours, page_cap, verbose)
+            for q in EVERYTHING_QUERIES
+        ]
+        return await asyncio.gather(*top, *everything)
+
+
+def iter_rows(
+    batches: Iterable[List[Dict]],
+    dedup_urls: set[str],
+) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Normalize articles into (headline, published_at, source, url) tuples,
+    skipping incomplete ones and URLs already seen (first occurrence wins).
+    """
+    for arts in batches:
+        for a in arts:
+            tup = _normalize_article(a)
+            if not tup:
+                continue
+            url = tup[3]
+            if url in dedup_urls:
+                continue
+            dedup_urls.add(url)
+            yield tup
 
 
 # -------------------------
@@ -322,73 +443,43 @@ def main():
     api_key = os.getenv("NEWS_API_KEY")
     if not api_key:
         raise RuntimeError("Missing NEWS_API_KEY in environment (set it in your .env).")
-    client = NewsApiClient(api_key=api_key)
 
     # DB setup
     db_path = resolve_db_path(args.db)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     log.info("Connecting to database at %s", db_path)
 
-    # Collect
-    rate_limited = False
+    # Fetch all sweeps concurrently, then normalize + dedup
+    results = asyncio.run(fetch_all(api_key, countries, page_cap, window_hours, verbose))
+    rate_limited = any(arts is None for arts in results)
     dedup_urls: set[str] = set()
-    rows: List[Tuple[str, str, str, str]] = []
+    rows = iter_rows((arts for arts in results if arts), dedup_urls)
 
-    # 1) Top Headlines breadth sweep
-    for country in countries:
-        if rate_limited:
-            break
-        for category in TOP_HEADLINES_CATEGORIES:
-            arts = fetch_top_headlines(client, country, category, page_cap=page_cap, verbose=verbose)
-            if arts is None:
-                log.warning("Rate-limited during top_headlines; stopping.")
-                rate_limited = True
-                break
-            if verbose:
-                log.info("top_headlines[%s/%s]: %d", country, category, len(arts))
-            for a in arts:
-                tup = _normalize_article(a)
-                if not tup:
-                    continue
-                h, pub, src, url = tup
-                if url in dedup_urls:
-                    continue
-                dedup_urls.add(url)
-                rows.append((h, pub, src, url))
-
-    # 2) Everything thematic sweep
-    if not rate_limited:
-        for q in EVERYTHING_QUERIES:
-            arts = fetch_everything(client, q, hours=window_hours, page_cap=page_cap, verbose=verbose)
-            if arts is None:
-                log.warning("Rate-limited during everything; stopping.")
-                rate_limited = True
-                break
-            if verbose:
-                log.info("everything[%s]: %d", q, len(arts))
-            for a in arts:
-                tup = _normalize_article(a)
-                if not tup:
-                    continue
-                h, pub, src, url = tup
-                if url in dedup_urls:
-                    continue
-                dedup_urls.add(url)
-                rows.append((h, pub, src, url))
-
-    # Upsert
-    changed = 0
     with sqlite3.connect(db_path) as con:
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA synchronous=NORMAL;")
+        con.execute("PRAGMA cache_size=-131072;")  # 128 MiB
         ensure_schema(con)
-        if rows:
-            cur = con.cursor()
-            cur.executemany(UPSERT_SQL, rows)
-            changed = cur.rowcount or 0
+        # one write transaction for the whole upsert -> a single commit/fsync;
+        # rows stream from normalization through the URL pre-filter into executemany
+        con.execute("BEGIN IMMEDIATE;")
+        cur = con.cursor()
+        cur.executemany(UPSERT_SQL, iter_changed(con, rows))
+        changed = cur.rowcount or 0
         con.commit()
+        # refresh planner stats as the table grows (cheap no-op when unneeded)
+        con.execute("PRAGMA optimize;")
+
+    if changed:
+        dropped = invalidate_cache("ms:v1:news:*")
+        log.info("Invalidated %d cached news responses", dropped)
 
     if rate_limited:
         log.warning("⚠️ Stopped early due to NewsAPI rate limit.")
-    log.info("✅ Total news upserted/updated: %d (processed=%d, unique urls=%d)", changed, len(rows), len(dedup_urls))
+    log.info(
+        "✅ Total news upserted/updated: %d (processed=%d)",
+        changed, len(dedup_urls),
+    )
 
 
 if __name__ == "__main__":
@@ -16,12 +16,16 @@ Expected schema (see db/sqlite/001_init.sql):
 
 from __future__ import annotations
 
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import Mapping, Optional, Sequence
+import functools
 import logging
 import re
 import sqlite3
+import sys
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
@@ -30,7 +34,12 @@ import yfinance as yf
 # --------------------------------------------------------------------------------------
 ROOT = Path(__file__).resolve().parents[2]
 DB_PATH = ROOT / "data" / "marketsense.db"
-INIT_SQL = ROOT / "db" / "sqlite" / "001_init.sql"
+
+# Repo root on sys.path so the shared `src` helpers import when run as a script
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from src.cache import invalidate_cache  # noqa: E402
+from src.db.db_setup import apply_migrations  # noqa: E402
 
 # --------------------------------------------------------------------------------------
 # Config
@@ -38,7 +47,23 @@ INIT_SQL = ROOT / "db" / "sqlite" / "001_init.sql"
 TICKERS: list[str] = ["AAPL", "MSFT"]
 DAYS: int = 10  # pull a small rolling window
 
-# SQLite UPSERT (PK = (ticker, date))
+# Column order shared by the normalized frames and UPSERT_SQL placeholders
+STOCK_COLUMNS: list[str] = ["ticker", "date", "open", "high", "low", "close", "volume"]
+OHLC_COLUMNS: list[str] = ["open", "high", "low", "close"]
+# Column labels of a per-ticker slice of yf.download(group_by="ticker")
+YF_FIELDS = frozenset({"Open", "High", "Low", "Close", "Volume"})
+
+# Bars older than a ticker's latest stored date are settled history: insert
+# gaps only, never rewrite. The latest stored bar (possibly captured intraday)
+# and anything newer are overwritten unconditionally.
+INSERT_SETTLED_SQL = """
+INSERT INTO stocks (ticker, date, open, high, low, close, volume)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(ticker, date) DO NOTHING;
+"""
+
+# SQLite UPSERT (PK = (ticker, date)); the WHERE skips identical rewrites,
+# so rowcount only counts bars that were inserted or actually changed
 UPSERT_SQL = """
 INSERT INTO stocks (ticker, date, open, high, low, close, volume)
 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -48,12 +73,11 @@ ON CONFLICT(ticker, date) DO UPDATE SET
   low    = excluded.low,
   close  = excluded.close,
   volume = excluded.volume
-WHERE
-  COALESCE(stocks.open,   -1.0) != COALESCE(excluded.open,   -1.0) OR
-  COALESCE(stocks.high,   -1.0) != COALESCE(excluded.high,   -1.0) OR
-  COALESCE(stocks.low,    -1.0) != COALESCE(excluded.low,    -1.0) OR
-  COALESCE(stocks.close,  -1.0) != COALESCE(excluded.close,  -1.0) OR
-  COALESCE(stocks.volume, -1   ) != COALESCE(excluded.volume, -1   );
+WHERE open   IS NOT excluded.open
+   OR high   IS NOT excluded.high
+   OR low    IS NOT excluded.low
+   OR close  IS NOT excluded.close
+   OR volume IS NOT excluded.volume;
 """
 
 # --------------------------------------------------------------------------------------
@@ -77,111 +101,166 @@ def _norm(s: str) -> str:
     return _non_alnum.sub("", s.lower())
 
 
+def _flat_name(c: object) -> str:
+    """('Close', 'AAPL') -> 'Close_AAPL'; ('Date', '') -> 'Date'; plain labels -> str."""
+    if isinstance(c, tuple):
+        return "_".join(str(x) for x in c if x is not None and x != "").strip()
+    return str(c)
+
+
+@functools.lru_cache(maxsize=None)
+def _norm_tuple(want: tuple[str, ...]) -> tuple[str, ...]:
+    """Normalized `want` prefixes (memoized; the same few tuples recur per ticker)."""
+    return tuple(_norm(w) for w in want)
+
+
 def _first_match(
-    columns: Sequence[str],
-    want: Sequence[str],
+    norm_map: Mapping[str, str],
+    want: tuple[str, ...],
     prefer_suffix: Optional[str] = None,
 ) -> Optional[str]:
     """
     Find first column whose normalized name starts with one of `want`.
+    `norm_map` maps column -> _norm(column) and is built once per frame.
     If `prefer_suffix` is provided (e.g., the ticker), prefer a column that ends with that.
     """
-    norm_map = {c: _norm(c) for c in columns}
-    # prefer “*_TICKER” if present
-    if prefer_suffix:
-        pref = prefer_suffix.lower()
-        for c, n in norm_map.items():
-            if any(n.startswith(_norm(w)) for w in want) and n.endswith(pref):
-                return c
-    # fallback: any matching start
+    prefixes = _norm_tuple(want)
+    pref = _norm(prefer_suffix) if prefer_suffix else None
+    fallback = None
+    # single pass: return a “*_TICKER” hit at once, else the first matching start
     for c, n in norm_map.items():
-        if any(n.startswith(_norm(w)) for w in want):
-            return c
-    return None
+        if n.startswith(prefixes):
+            if pref is None or n.endswith(pref):
+                return c
+            if fallback is None:
+                fallback = c
+    return fallback
 
 
 def ensure_schema(con: sqlite3.Connection) -> None:
-    """Create tables if needed using INIT_SQL."""
-    cur = con.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='stocks';"
+    """Create/upgrade the schema via the shared migrations (no-op once current)."""
+    ran = apply_migrations(con)
+    if ran:
+        log.info("Applied %d schema migration(s)", ran)
+
+
+def last_dates(con: sqlite3.Connection, tickers: Sequence[str]) -> dict[str, str]:
+    """Latest stored bar date (ISO) per ticker; tickers with no rows are absent."""
+    marks = ",".join("?" * len(tickers))
+    return dict(con.execute(
+        f"SELECT ticker, MAX(date) FROM stocks WHERE ticker IN ({marks}) GROUP BY ticker;",
+        list(tickers),
+    ))
+
+
+def fetch_start(last: Mapping[str, str], tickers: Sequence[str], days: int = DAYS) -> date:
+    """
+    First day the watchlist still needs: a day before each ticker's latest stored
+    bar (so a partial last bar gets refreshed), or a full `days` window for
+    tickers with no rows yet. Re-runs then only download the new bars.
+    """
+    fallback = date.today() - timedelta(days=days)
+    return min(
+        date.fromisoformat(last[t]) - timedelta(days=1) if t in last else fallback
+        for t in tickers
     )
-    exists = cur.fetchone() is not None
-    if exists:
-        return
-    if INIT_SQL.exists():
-        log.info("stocks table missing — applying schema from %s", INIT_SQL)
-        with open(INIT_SQL, "r", encoding="utf-8") as f:
-            con.executescript(f.read())
-        log.info("Schema applied.")
-    else:
-        # minimalist create if init file is not present for any reason
-        log.warning(
-            "Init SQL not found at %s — creating minimal stocks table inline.",
-            INIT_SQL,
-        )
-        con.executescript(
-            """
-            PRAGMA foreign_keys=ON;
-            CREATE TABLE IF NOT EXISTS stocks (
-              ticker  TEXT NOT NULL,
-              date    TEXT NOT NULL,
-              open    REAL, high REAL, low REAL,
-              close   REAL NOT NULL,
-              volume  INTEGER DEFAULT 0 CHECK (volume >= 0),
-              PRIMARY KEY (ticker, date)
-            );
-            """
-        )
 
 
-def fetch_daily_window(ticker: str, days: int = DAYS) -> pd.DataFrame:
+def fetch_daily_windows(
+    tickers: Sequence[str],
+    days: int = DAYS,
+    start: Optional[date] = None,
+) -> dict[str, pd.DataFrame]:
     """
-    Download recent daily OHLCV and normalize columns/types.
-    Robust to MultiIndex/tuple columns and suffixed names like 'Close_AAPL'.
+    Download daily OHLCV for all `tickers` in one batched request and normalize
+    each ticker's slice. Fetches from `start` when given, else the last `days`
+    days. Tickers with no usable data are left out.
     """
-    df = yf.download(
-        ticker,
-        period=f"{days}d",
+    window = {"start": start.isoformat()} if start else {"period": f"{days}d"}
+    raw = yf.download(
+        list(tickers),
+        **window,
         interval="1d",
         auto_adjust=False,   # be explicit (yfinance changed defaults)
+        group_by="ticker",   # columns: (ticker, field)
+        threads=True,
         progress=False,
     )
-    if df is None or df.empty:
-        log.warning("No data returned for %s", ticker)
-        return pd.DataFrame()
+    if raw is None or raw.empty:
+        log.warning("No data returned for %s", ", ".join(tickers))
+        return {}
+
+    grouped = isinstance(raw.columns, pd.MultiIndex)
+    present = set(raw.columns.get_level_values(0)) if grouped else set()
+    frames: dict[str, pd.DataFrame] = {}
+    for ticker in tickers:
+        if grouped and ticker in present:
+            df = raw[ticker]
+        elif not grouped and len(tickers) == 1:
+            df = raw  # older yfinance: single symbol comes back flat
+        else:
+            log.warning("No data returned for %s", ticker)
+            continue
+        out = _normalize_window(df, ticker)
+        if not out.empty:
+            frames[ticker] = out
+    return frames
+
 
+def fetch_daily_window(ticker: str, days: int = DAYS) -> pd.DataFrame:
+    """Single-ticker convenience wrapper around fetch_daily_windows."""
+    return fetch_daily_windows([ticker], days=days).get(ticker, pd.DataFrame())
+
+
+def _select_known(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Fast path for the shape yfinance returns for one grouped ticker: flat
+    Open/High/Low/Close/Volume columns over a DatetimeIndex. Returns None for
+    anything else so the caller falls back to column inference.
+    """
+    if not isinstance(df.index, pd.DatetimeIndex) or not YF_FIELDS.issubset(df.columns):
+        return None
+    return pd.DataFrame(
+        {
+            "date": df.index.strftime("%Y-%m-%d"),
+            "open": df["Open"].to_numpy(),
+            "high": df["High"].to_numpy(),
+            "low": df["Low"].to_numpy(),
+            "close": df["Close"].to_numpy(),
+            "volume": df["Volume"].to_numpy(),
+        }
+    )
+
+
+def _select_inferred(df: pd.DataFrame, ticker: str) -> Optional[pd.DataFrame]:
+    """
+    Pick the OHLCV columns by name matching.
+    Robust to MultiIndex/tuple columns and suffixed names like 'Close_AAPL'.
+    """
     # Flatten to simple columns
     df = df.reset_index()
-    if isinstance(df.columns, pd.MultiIndex) or any(isinstance(c, tuple) for c in df.columns):
-        flat_cols = []
-        for c in df.columns:
-            if isinstance(c, tuple):
-                flat_cols.append("_".join([str(x) for x in c if x is not None]).strip())
-            else:
-                flat_cols.append(str(c))
-        df.columns = flat_cols
-    else:
-        df.columns = [str(c) for c in df.columns]
+    df.columns = df.columns.to_flat_index().map(_flat_name)
 
     log.info("%s columns: %s", ticker, list(df.columns))
 
     # Resolve columns (handle e.g. Close_AAPL, Adj Close_AAPL)
-    date_col = _first_match(df.columns, ["date", "datetime"]) or "Date"
-    open_col = _first_match(df.columns, ["open"], ticker)
-    high_col = _first_match(df.columns, ["high"], ticker)
-    low_col = _first_match(df.columns, ["low"], ticker)
+    norm_map = {c: _norm(c) for c in df.columns}
+    date_col = _first_match(norm_map, ("date", "datetime")) or "Date"
+    open_col = _first_match(norm_map, ("open",), ticker)
+    high_col = _first_match(norm_map, ("high",), ticker)
+    low_col = _first_match(norm_map, ("low",), ticker)
     # Prefer true Close over Adj Close if both exist
     close_col = (
-        _first_match(df.columns, ["close"], ticker)
-        or _first_match(df.columns, ["adj close", "adj_close"], ticker)
+        _first_match(norm_map, ("close",), ticker)
+        or _first_match(norm_map, ("adj close", "adj_close"), ticker)
     )
-    volume_col = _first_match(df.columns, ["volume"], ticker)
+    volume_col = _first_match(norm_map, ("volume",), ticker)
 
     if close_col is None:
         log.warning("No close/adj close column found for %s; skipping", ticker)
-        return pd.DataFrame()
+        return None
 
-    out = pd.DataFrame(
+    return pd.DataFrame(
         {
             "date": pd.to_datetime(df[date_col]).dt.strftime("%Y-%m-%d"),
             "open": df[open_col] if open_col in df.columns else None,
@@ -191,17 +270,29 @@ def fetch_daily_window(ticker: str, days: int = DAYS) -> pd.DataFrame:
             "volume": df[volume_col] if volume_col in df.columns else 0,
         }
     )
+
+
+def _normalize_window(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """Normalize one ticker's raw yfinance frame to the `stocks` columns/types."""
+    out = _select_known(df)
+    if out is None:
+        out = _select_inferred(df, ticker)
+        if out is None:
+            return pd.DataFrame()
     out["ticker"] = ticker
 
     # Clean types / constraints
     out = out.dropna(subset=["close"])
-    out["close"] = pd.to_numeric(out["close"], errors="coerce").fillna(0).clip(lower=0)
-
-    for col in ["open", "high", "low"]:
-        if col in out.columns:
+    for col in OHLC_COLUMNS:
+        # yfinance already hands back float64; only coerce missing/odd columns
+        if not pd.api.types.is_float_dtype(out[col]):
             out[col] = pd.to_numeric(out[col], errors="coerce")
-            # keep NaNs as NULLs, otherwise clip negatives
-            out[col] = out[col].where(out[col].isna(), out[col].clip(lower=0))
+    out["close"] = out["close"].fillna(0)
+    # clip negatives in place over the 2-D OHLC block; np.maximum keeps NaN
+    # (-> NULL), so no isna() mask is needed
+    ohlc = out[OHLC_COLUMNS].to_numpy(dtype="float64")
+    np.maximum(ohlc, 0.0, out=ohlc)
+    out[OHLC_COLUMNS] = ohlc
 
     out["volume"] = (
         pd.to_numeric(out["volume"], errors="coerce")
@@ -212,47 +303,81 @@ def fetch_daily_window(ticker: str, days: int = DAYS) -> pd.DataFrame:
 
     # Ensure low <= high when both present
     if "low" in out.columns and "high" in out.columns:
-        mask = out["low"].notna() & out["high"].notna() & (out["low"] > out["high"])
-        if mask.any():
-            swapped = int(mask.sum())
-            low_vals = out.loc[mask, "low"].copy()
-            out.loc[mask, "low"] = out.loc[mask, "high"].values
-            out.loc[mask, "high"] = low_vals.values
-            log.debug("Swapped %d rows to enforce low<=high for %s", swapped, ticker)
+        low = out["low"].to_numpy(dtype="float64")
+        high = out["high"].to_numpy(dtype="float64")
+        # NaN compares False, so NULL-side rows are left alone (np.minimum/
+        # np.maximum would propagate the NaN into the other column)
+        swap = low > high
+        if swap.any():
+            out["low"] = np.where(swap, high, low)
+            out["high"] = np.where(swap, low, high)
+            log.debug("Swapped %d rows to enforce low<=high for %s", int(swap.sum()), ticker)
 
     log.info("Normalized frame for %s has %d rows", ticker, len(out))
-    return out[["ticker", "date", "open", "high", "low", "close", "volume"]]
+    return out[STOCK_COLUMNS]
 
 
-def upsert_df(con: sqlite3.Connection, df: pd.DataFrame) -> int:
-    """Bulk UPSERT rows; returns number of rows inserted/updated (SQLite rowcount)."""
+def upsert_df(
+    con: sqlite3.Connection,
+    df: pd.DataFrame,
+    last: Optional[Mapping[str, str]] = None,
+) -> int:
+    """
+    Bulk UPSERT rows; returns number of rows inserted or changed (SQLite rowcount).
+    Rows dated before their ticker's entry in `last` only fill gaps.
+    """
     if df.empty:
         return 0
-    rows = [tuple(r) for r in df.itertuples(index=False, name=None)]
+    # PK order -> each insert lands next to the previous one in the B-tree
+    df = df.sort_values(["ticker", "date"], ignore_index=True)
+    settled = df["date"] < df["ticker"].map(last or {}).fillna("")
     cur = con.cursor()
-    cur.executemany(UPSERT_SQL, rows)
-    return cur.rowcount or 0
+    changed = 0
+    for sql, part in ((INSERT_SETTLED_SQL, df[settled]), (UPSERT_SQL, df[~settled])):
+        if part.empty:
+            continue
+        # column-wise tolist() unboxes each column in C (and yields plain Python
+        # int/float, which sqlite3 binds directly unlike numpy scalars)
+        cur.executemany(sql, zip(*(part[c].tolist() for c in STOCK_COLUMNS)))
+        changed += cur.rowcount or 0
+    return changed
 
 
 def main() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     log.info("Connecting to database at %s", DB_PATH)
 
-    total = 0
     with sqlite3.connect(DB_PATH) as con:
         con.execute("PRAGMA foreign_keys = ON;")
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA synchronous=NORMAL;")
+        con.execute("PRAGMA temp_store=MEMORY;")
+        con.execute("PRAGMA cache_size=-65536;")    # 64 MiB
+        con.execute("PRAGMA mmap_size=268435456;")  # 256 MiB
         ensure_schema(con)
 
-        for t in TICKERS:
-            log.info("Fetching %d days for %s", DAYS, t)
-            df = fetch_daily_window(t, days=DAYS)
-            up = upsert_df(con, df)
-            total += up
-            log.info("%s: upserted/updated %d", t, up)
+        # one batched download for the whole watchlist, only from the last stored bar
+        last = last_dates(con, TICKERS)
+        start = fetch_start(last, TICKERS, days=DAYS)
+        log.info("Fetching %s since %s", ", ".join(TICKERS), start)
+        frames = fetch_daily_windows(TICKERS, days=DAYS, start=start)
+
+        # one write transaction and one batch for every ticker -> a single
+        # executemany per statement and a single commit/fsync
+        combined = pd.concat(frames.values(), ignore_index=True) if frames else pd.DataFrame()
+        log.info("Upserting %d rows for %d tickers", len(combined), len(frames))
+        con.execute("BEGIN IMMEDIATE;")
+        total = upsert_df(con, combined, last)
 
         con.commit()
+        # refresh planner stats as the table grows (cheap no-op when unneeded)
+        con.execute("PRAGMA optimize;")
+
+    if total:
+        dropped = invalidate_cache("ms:v1:stocks:*")
+        log.info("Invalidated %d cached stock responses", dropped)
 
-    log.info("✅ Total upserted/updated rows: %d", total)
+    log.info("✅ Total inserted/changed rows: %d", total)
 
 
 if __name__ == "__main__":
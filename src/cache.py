@@ -0,0 +1,28 @@
+# src/cache.py
+import logging
+import os
+
+import redis
+
+log = logging.getLogger(__name__)
+
+# Keys per SCAN page / DEL call
+CHUNK = 500
+
+def invalidate_cache(pattern: str) -> int:
+    """
+    Drop the API's cached responses matching `pattern` after an ingest run.
+    No-op without REDIS_URL; Redis errors are logged, never raised.
+    """
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return 0
+    try:
+        r = redis.Redis.from_url(url, socket_timeout=5)
+        keys = list(r.scan_iter(match=pattern, count=CHUNK))
+        for i in range(0, len(keys), CHUNK):
+            r.delete(*keys[i:i + CHUNK])
+        return len(keys)
+    except redis.RedisError as e:
+        log.warning("Cache invalidation failed for %s: %s", pattern, e)
+        return 0
@@ -1,21 +1,39 @@
 ﻿from pathlib import Path
 import sqlite3
 
-# Ensure /data exists
-Path("data").mkdir(exist_ok=True)
-
+ROOT = Path(__file__).resolve().parents[2]
 DB_PATH = Path("data/marketsense.db")
-MIGRATION = Path("db/sqlite/001_init.sql")
+# Applied in order; PRAGMA user_version records how many a DB already has
+MIGRATIONS = (
+    ROOT / "db" / "sqlite" / "001_init.sql",
+    ROOT / "db" / "sqlite" / "002_indexes.sql",
+)
+
+def apply_migrations(con: sqlite3.Connection) -> int:
+    """
+    Bring `con` up to the latest migration and return how many ran.
+    Shared by db_setup and the ingest jobs, so a DB bootstrapped by either
+    gets the same schema (news_fts, covering indexes). Only scripts past the
+    DB's user_version run: 002 rebuilds the FTS index and runs ANALYZE.
+    """
+    done = con.execute("PRAGMA user_version;").fetchone()[0]
+    for n, migration in enumerate(MIGRATIONS[done:], start=done + 1):
+        con.executescript(migration.read_text(encoding="utf-8-sig"))
+        con.execute(f"PRAGMA user_version = {n};")
+    return len(MIGRATIONS[done:])
 
 def main():
-    if not MIGRATION.exists():
-        raise FileNotFoundError(f"Migration not found: {MIGRATION}")
-    sql = MIGRATION.read_text(encoding="utf-8")
+    # Ensure /data exists
+    Path("data").mkdir(exist_ok=True)
+    for migration in MIGRATIONS:
+        if not migration.exists():
+            raise FileNotFoundError(f"Migration not found: {migration}")
     con = sqlite3.connect(DB_PATH)
     try:
-        con.executescript(sql)
-        con.commit()
-        print(f"✅ DB initialized from migration -> {DB_PATH}")
+        # WAL is persistent in the file; the API opens it read-only and relies on it
+        con.execute("PRAGMA journal_mode=WAL;")
+        ran = apply_migrations(con)
+        print(f"✅ DB initialized from migrations -> {DB_PATH} ({ran} applied)")
     finally:
         con.close()
 
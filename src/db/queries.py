@@ -1,34 +1,49 @@
 ﻿# src/db/queries.py
-from typing import List, Tuple
-from sqlalchemy import create_engine, text
+from typing import List, Optional, Tuple
+from sqlalchemy import Connection, create_engine, text
 import os
 
 # Configurable DB URL; falls back to local SQLite file
 DB_URL = os.getenv("MARKETSENSE_DB_URL", "sqlite:///data/marketsense.db")
 engine = create_engine(DB_URL, future=True)
 
-def get_recent_closes(ticker: str, days: int = 7) -> List[Tuple[str, float]]:
-    n = int(days)
-    sql = text(f"""
-        SELECT date, close
-        FROM stocks
-        WHERE ticker = :t
-        ORDER BY date DESC
-        LIMIT {n};
-    """)
-    with engine.connect() as conn:
-        rows = conn.execute(sql, {"t": ticker.upper()}).fetchall()
+# Bound LIMIT (not f-string interpolated) so each statement compiles once and
+# is reused for every limit value. Both are index walks: stocks via
+# idx_stocks_ticker_date_close (002_indexes.sql), news via the id primary key.
+_SQL_RECENT_CLOSES = text("""
+    SELECT date, close
+    FROM stocks
+    WHERE ticker = :t
+    ORDER BY date DESC
+    LIMIT :n;
+""")
+
+_SQL_LATEST_NEWS = text("""
+    SELECT headline, published_at, COALESCE(source, 'unknown') as source
+    FROM news
+    ORDER BY id DESC
+    LIMIT :n;
+""")
+
+def get_connection() -> Connection:
+    """
+    Check out one pooled connection to share across several helper calls
+    (e.g. a batch job); use as `with get_connection() as conn: ...`.
+    """
+    return engine.connect()
+
+def _fetchall(sql, params: dict, conn: Optional[Connection] = None) -> list:
+    if conn is not None:
+        return conn.execute(sql, params).fetchall()
+    with engine.connect() as own:
+        return own.execute(sql, params).fetchall()
+
+def get_recent_closes(
+    ticker: str, days: int = 7, conn: Optional[Connection] = None
+) -> List[Tuple[str, float]]:
+    rows = _fetchall(_SQL_RECENT_CLOSES, {"t": ticker.upper(), "n": int(days)}, conn)
     # Return oldest→newest for charts
     return list(reversed(rows))
 
-def get_latest_news(limit: int = 20) -> List[Tuple[str, str, str]]:
-    l = int(limit)
-    sql = text(f"""
-        SELECT headline, published_at, COALESCE(source, 'unknown') as source
-        FROM news
-        ORDER BY id DESC
-        LIMIT {l};
-    """)
-    with engine.connect() as conn:
-        rows = conn.execute(sql).fetchall()
-    return rows
+def get_latest_news(limit: int = 20, conn: Optional[Connection] = None) -> List[Tuple[str, str, str]]:
+    return _fetchall(_SQL_LATEST_NEWS, {"n": int(limit)}, conn)
@@ -1,5 +1,11 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
 from fastapi.testclient import TestClient
+import api.main as api_main
 from api.main import app
+from src.db.db_setup import MIGRATIONS, apply_migrations
 
 client = TestClient(app)
 
@@ -54,3 +60,50 @@ def test_news_last_n_ok_or_404():
 def test_news_query_ok_or_404():
     r = client.get("/news", params={"days": 7, "q": "earnings", "limit": 5})
     assert r.status_code in (200, 404)
+
+def test_news_cursor_pages_do_not_overlap():
+    r = client.get("/news/last-n", params={"limit": 2})
+    assert r.status_code in (200, 404)
+    cursor = r.headers.get("X-Next-Cursor")
+    if r.status_code == 200 and cursor:
+        r2 = client.get("/news/last-n", params={"limit": 2, "cursor": cursor})
+        assert r2.status_code in (200, 404)
+        if r2.status_code == 200:
+            first_ids = {row["id"] for row in r.json()}
+            assert not first_ids & {row["id"] for row in r2.json()}
+
+def test_news_invalid_cursor_400():
+    r = client.get("/news", params={"days": 7, "cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+def test_stocks_malformed_ticker_422():
+    r = client.get("/stocks/BAD!TICKER", params={"days": 7})
+    assert r.status_code == 422
+
+def test_news_query_on_ingest_created_db(tmp_path, monkeypatch):
+    # DB bootstrapped only by an ingest job (the Airflow path), not db_setup.py
+    from scripts.jobs import fetch_news
+    db = tmp_path / "ingest.db"
+    con = sqlite3.connect(db)
+    fetch_news.ensure_schema(con)
+    assert con.execute("PRAGMA user_version;").fetchone()[0] == len(MIGRATIONS)
+    # a second run is a no-op: no FTS 'rebuild', no ANALYZE
+    statements = []
+    con.set_trace_callback(statements.append)
+    assert apply_migrations(con) == 0
+    con.set_trace_callback(None)
+    assert not any("rebuild" in s or "ANALYZE" in s for s in statements)
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    con.execute(
+        "INSERT INTO news (headline, published_at, source, url) VALUES (?, ?, ?, ?)",
+        ("Quarterly earnings beat", now, "Reuters", "https://example.com/earnings"),
+    )
+    con.commit()
+    con.close()
+
+    monkeypatch.setattr(api_main, "DB_PATH", db)
+    monkeypatch.setattr(api_main, "_DB_URI", f"{db.as_uri()}?mode=ro")
+    monkeypatch.setattr(api_main, "_local", threading.local())
+    r = client.get("/news", params={"days": 7, "q": "earnings"})
+    assert r.status_code == 200
+    assert [row["url"] for row in r.json()] == ["https://example.com/earnings"]
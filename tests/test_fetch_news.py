@@ -0,0 +1,7 @@
+from scripts.jobs.fetch_news import normalize_published_at
+
+def test_published_at_fast_path_rejects_impossible_fields():
+    assert normalize_published_at("2025-08-21T12:34:56Z") == "2025-08-21T12:34:56"
+    assert normalize_published_at("2024-13-45T99:99:99Z") is None
+    # bad clock, good date -> the lenient date-only fallback, as before the fast path
+    assert normalize_published_at("2024-01-05T25:00:00Z") == "2024-01-05T00:00:00"
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("yfinance")
+from scripts.jobs.fetch_prices import STOCK_COLUMNS, last_dates, upsert_df  # noqa: E402
+from src.db.db_setup import apply_migrations  # noqa: E402
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=STOCK_COLUMNS)
+
+def test_upsert_keeps_settled_fills_gaps_and_rewrites_latest():
+    con = sqlite3.connect(":memory:")
+    apply_migrations(con)
+    con.executemany(
+        "INSERT INTO stocks (ticker, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [("AAPL", "2025-08-18", 10.0, 11.0, 9.0, 10.5, 100),
+         ("AAPL", "2025-08-20", 20.0, 21.0, 19.0, 20.5, 200)],
+    )
+    last = last_dates(con, ["AAPL"])
+    df = _frame([
+        ("AAPL", "2025-08-18", 99.0, 99.0, 99.0, 99.0, 999),  # settled: kept
+        ("AAPL", "2025-08-19", 15.0, 16.0, 14.0, 15.5, 150),  # gap: filled
+        ("AAPL", "2025-08-20", 22.0, 23.0, 21.0, 22.5, 250),  # latest: rewritten
+    ])
+    assert upsert_df(con, df, last) == 2
+
+    rows = con.execute("SELECT date, close FROM stocks WHERE ticker = 'AAPL' ORDER BY date").fetchall()
+    assert rows == [("2025-08-18", 10.5), ("2025-08-19", 15.5), ("2025-08-20", 22.5)]
+
+    # re-running with the same bars changes nothing, so nothing is counted
+    assert upsert_df(con, df, last_dates(con, ["AAPL"])) == 0